@@ -10,48 +10,251 @@ Functions:
 -------------
 .. autosummary::
     field_observatory_S3.csv_files
+    field_observatory_S3.read_csv_file
     field_observatory_S3.read_files_to_dataframe
 
 Author: Olli Nevalainen, Finnish Meteorological Institute
 """
 
+import contextlib
+import copy
 import os
-import json
-from typing import Optional, Union
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, Union
+import orjson
 import pandas as pd
 import boto3
 from botocore import UNSIGNED
 from botocore.config import Config
+from botocore.exceptions import ClientError
+
+if TYPE_CHECKING:
+    import pyarrow
 
 FO_BLOCK_GEOJSON = "fieldobs_blocks_translated.geojson"
 FO_SITE_GEOJSON = "fieldobs_sites_translated.geojson"
+MAX_DOWNLOAD_WORKERS = 16
+MAX_BATCH_WORKERS = 32
+FO_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "field_observatory_s3")
+FO_CACHE_MAX_SIZE = 256 * 1024**2
+FO_CACHE_SUFFIX = ".fo-cache"
 
 
 class FOBucket:
     """
     Class for handling the Field Observatory S3 bucket
 
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Directory for caching events and geojson files on disk between
+        sessions. The files are keyed by their ETag, so a changed object is
+        downloaded again. Set to None to disable the disk cache.
+    cache_max_size : int, optional
+        Maximum total size of the disk cache in bytes. The least recently
+        used files are removed when a new file would exceed it.
+
     Attributes
     ----------
     s3 : boto3.resource
         S3 resource
+    client : botocore.client.S3
+        Low-level S3 client of the resource, used for all reads
     bucket : boto3.Bucket
         S3 bucket
+    cache_dir : str or None
+        Directory of the on-disk object cache, None if disabled
+    cache_max_size : int
+        Maximum total size of the disk cache in bytes
 
     """
 
     FO_BUCKET_ENDPOINT = "https://data.lit.fmi.fi"
     FO_BUCKET_NAME = "field-observatory"
+    FO_BUCKET_URL = f"https://{FO_BUCKET_NAME}.{FO_BUCKET_ENDPOINT[len('https://'):]}/"
+    _default: Optional["FOBucket"] = None
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        cache_dir: Optional[str] = FO_CACHE_DIR,
+        cache_max_size: int = FO_CACHE_MAX_SIZE,
+    ) -> None:
         s3 = boto3.resource(
             service_name="s3",
             endpoint_url=FOBucket.FO_BUCKET_ENDPOINT,
-            config=Config(signature_version=UNSIGNED),
+            config=Config(
+                signature_version=UNSIGNED,
+                max_pool_connections=max(MAX_DOWNLOAD_WORKERS, MAX_BATCH_WORKERS),
+            ),
         )
         bucket = s3.Bucket(FOBucket.FO_BUCKET_NAME)
         self.s3 = s3
+        self.client = s3.meta.client
         self.bucket = bucket
+        self.cache_dir = cache_dir
+        self.cache_max_size = cache_max_size
+        self._events_cache = {}
+        self._event_dates_cache = {}
+        self._classified_events_cache = {}
+        self._block_json = None
+        self._field_index = None
+        self._site_json = None
+        self._site_index = None
+
+    @classmethod
+    def default(cls) -> "FOBucket":
+        """
+        Get a shared FOBucket instance
+
+        The instance is created on first call. Reusing it shares the S3
+        connection pool and the caches between callers.
+
+        Returns
+        -------
+        fo_bucket : FOBucket
+            Shared FOBucket instance with the default settings
+        """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def invalidate_cache(self) -> None:
+        """
+        Clear the in-memory cache of events and geojson files
+
+        Use this if the bucket contents may have changed since they were
+        first read.
+        """
+        self._events_cache = {}
+        self._event_dates_cache = {}
+        self._classified_events_cache = {}
+        self._block_json = None
+        self._field_index = None
+        self._site_json = None
+        self._site_index = None
+
+    def _read_object(self, key: str) -> bytes:
+        """
+        Read an object from S3 bucket, using the disk cache if enabled
+
+        Parameters
+        ----------
+        key : str
+            Key of the object
+
+        Returns
+        -------
+        content : bytes
+            Content of the object
+
+        Raises
+        ------
+        botocore.exceptions.ClientError
+            If the object does not exist
+        """
+        if self.cache_dir is None:
+            response = self.client.get_object(Bucket=FOBucket.FO_BUCKET_NAME, Key=key)
+            return response["Body"].read()
+
+        etag = self.client.head_object(Bucket=FOBucket.FO_BUCKET_NAME, Key=key)["ETag"]
+        cache_name = _cache_file_name(etag)
+        if cache_name is not None:
+            cache_file = os.path.join(self.cache_dir, cache_name)
+            try:
+                with open(cache_file, "rb") as f:
+                    content = f.read()
+            except OSError:
+                content = None
+            if content is not None:
+                # Mark the file as recently used for the cache size bound
+                with contextlib.suppress(OSError):
+                    os.utime(cache_file)
+                return content
+
+        response = self.client.get_object(Bucket=FOBucket.FO_BUCKET_NAME, Key=key)
+        content = response["Body"].read()
+        # Name the file by the ETag of the content actually downloaded
+        cache_name = _cache_file_name(response.get("ETag", ""))
+        if cache_name is not None:
+            try:
+                self._write_disk_cache(cache_name, content)
+            except OSError:
+                # The disk cache is optional, an unusable cache must not fail reads
+                pass
+        return content
+
+    def _write_disk_cache(self, name: str, content: bytes) -> None:
+        """
+        Write a file to the disk cache and evict the least recently used files
+
+        Only files with the cache suffix are evicted, so other files in the
+        cache directory are never removed.
+
+        Parameters
+        ----------
+        name : str
+            Name of the file in the cache directory
+        content : bytes
+            Content of the file
+
+        Raises
+        ------
+        OSError
+            If the cache directory can't be created or written
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a temporary file first so readers never see partial files
+        fd, tmp_file = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_file, os.path.join(self.cache_dir, name))
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_file)
+            raise
+
+        cached_files = []
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(FO_CACHE_SUFFIX):
+                    stat = entry.stat()
+                    cached_files.append((stat.st_mtime, stat.st_size, entry.path))
+        cache_size = sum(size for _, size, _ in cached_files)
+        for _, size, path in sorted(cached_files):
+            if cache_size <= self.cache_max_size:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            cache_size -= size
+
+    def iter_files(self, prefix: str, return_key: bool = False) -> Iterator[str]:
+        """
+        Iterate over files in a given prefix
+
+        Objects are listed page by page, so stopping the iteration early
+        avoids requesting the remaining pages.
+
+        Parameters
+        ----------
+        prefix : str
+            Prefix of the files
+        return_key : bool, optional
+            If True, yields only the key, otherwise yields the full URL
+
+        Yields
+        ------
+        file_or_key : str
+            File URL or key
+
+        """
+        url_prefix = "" if return_key else FOBucket.FO_BUCKET_URL
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket.name, Prefix=prefix):
+            for object in page.get("Contents", []):
+                yield url_prefix + object["Key"]
 
     def list_files(self, prefix: str, return_key: bool = False) -> list:
         """
@@ -70,14 +273,7 @@ class FOBucket:
             List of files or keys
 
         """
-        files_or_keys = []
-        for object in self.bucket.objects.filter(Prefix=prefix):
-            if return_key:
-                files_or_keys.append(object.key)
-            else:
-                end_point = FOBucket.FO_BUCKET_ENDPOINT.split("https://")[1]
-                object_url = f"https://{self.bucket.name}.{end_point}/{object.key}"
-                files_or_keys.append(object_url)
+        files_or_keys = list(self.iter_files(prefix, return_key=return_key))
         return files_or_keys
 
     # Event file handling
@@ -94,19 +290,183 @@ class FOBucket:
         -------
         events : dict
             Events for the field
+
+        Notes
+        -----
+        The events are cached per field, see `invalidate_cache`. Each call
+        returns a new copy, so modifying it does not change the cache.
+        """
+        events = self._get_cached_events(field_id)
+        return copy.deepcopy(events)
+
+    def _get_cached_events(self, field_id: str) -> Optional[dict]:
+        """
+        Get the cached events of a field, reading them on first use
+
+        The returned dict is shared with the cache and must not be modified.
+
+        Parameters
+        ----------
+        field_id : str
+            Field ID
+
+        Returns
+        -------
+        events : dict or None
+            Events for the field, None if the field has no events file
         """
+        if field_id in self._events_cache:
+            return self._events_cache[field_id]
+
         prefix = field_id.replace("_", "/")
-        field_files = self.list_files(prefix, return_key=True)
         events_file = os.path.join(prefix, "events.json")
-        if events_file in field_files:
-            object = self.s3.Object(FOBucket.FO_BUCKET_NAME, events_file)
-            file_content = object.get()["Body"].read().decode("utf-8")
-            events = json.loads(file_content)
-        else:
+        try:
+            file_content = self._read_object(events_file)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                raise
             print(f"No events file for field {field_id}")
             events = None
+        else:
+            events = orjson.loads(file_content)
+        self._events_cache[field_id] = events
         return events
 
+    def _map_fields(
+        self, getter: Callable, field_ids: Iterable[str], max_workers: int
+    ) -> dict:
+        """
+        Call a per-field getter for several fields concurrently
+
+        Parameters
+        ----------
+        getter : callable
+            Getter taking a field ID
+        field_ids : iterable
+            Field IDs, e.g. a list or a generator
+        max_workers : int
+            Maximum number of concurrent requests
+
+        Returns
+        -------
+        results : dict
+            Results of the getter keyed by field ID
+        """
+        # Iterate the IDs only once, a generator would be empty for zip
+        field_ids = list(field_ids)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = dict(zip(field_ids, executor.map(getter, field_ids)))
+        return results
+
+    def get_events_batch(
+        self, field_ids: list, max_workers: int = MAX_BATCH_WORKERS
+    ) -> dict:
+        """
+        Get events for several fields concurrently
+
+        The events files are requested in a thread pool sharing the
+        connection pool of the S3 client. The S3 endpoint tolerates dozens
+        of concurrent GETs per client.
+
+        Parameters
+        ----------
+        field_ids : list
+            Field IDs
+        max_workers : int, optional
+            Maximum number of concurrent requests
+
+        Returns
+        -------
+        events : dict
+            Events keyed by field ID, None for fields without events file
+        """
+        return self._map_fields(self.get_events, field_ids, max_workers)
+
+    def _get_event_dates(self, field_id: str) -> Optional[tuple]:
+        """
+        Get the types and parsed dates of the dated management events
+
+        Parameters
+        ----------
+        field_id : str
+            Field ID
+
+        Returns
+        -------
+        event_dates : tuple or None
+            List of event types and DatetimeIndex of the matching dates, for
+            the management events that have a date, or None if the field has
+            no events file
+
+        Notes
+        -----
+        The dates are parsed once so `get_event_type` can match a date with
+        one vectorized comparison. The result is cached per field, see
+        `invalidate_cache`.
+        """
+        if field_id in self._event_dates_cache:
+            return self._event_dates_cache[field_id]
+
+        events = self._get_cached_events(field_id)
+        if events is None:
+            event_dates = None
+        else:
+            # If no date, skip
+            dated_events = [
+                event for event in events["management"]["events"] if "date" in event
+            ]
+            event_dates = (
+                [event["mgmt_operations_event"] for event in dated_events],
+                pd.to_datetime(
+                    [event["date"] for event in dated_events], format="mixed"
+                ),
+            )
+        self._event_dates_cache[field_id] = event_dates
+        return event_dates
+
+    def _classify_events(self, field_id: str) -> dict:
+        """
+        Group the management events of a field by type in a single pass
+
+        Parameters
+        ----------
+        field_id : str
+            Field ID
+
+        Returns
+        -------
+        classified_events : dict
+            Management events keyed by "harvest", "mowing", "observation"
+            and "harvest_or_mowing", in the order of the events file
+
+        Notes
+        -----
+        The grouping is cached per field, see `invalidate_cache`. The getters
+        build their results from the groups on each call, so a malformed
+        event only affects the getters that read its fields.
+        """
+        if field_id in self._classified_events_cache:
+            return self._classified_events_cache[field_id]
+
+        classified_events = {
+            "harvest": [],
+            "mowing": [],
+            "observation": [],
+            "harvest_or_mowing": [],
+        }
+        events = self._get_cached_events(field_id)
+        if events is not None:
+            for event in events["management"]["events"]:
+                event_type = event["mgmt_operations_event"]
+                if event_type in ("harvest", "mowing"):
+                    classified_events[event_type].append(event)
+                    classified_events["harvest_or_mowing"].append(event)
+                elif event_type == "observation":
+                    classified_events["observation"].append(event)
+
+        self._classified_events_cache[field_id] = classified_events
+        return classified_events
+
     def get_harvest_dates(self, field_id: str) -> list:
         """
         Get harvest dates for a given field
@@ -121,14 +481,8 @@ class FOBucket:
         harvest_dates : list
             Harvest dates for the field
         """
-        events = self.get_events(field_id)
-        if events is None:
-            return []
-        management_events = events["management"]["events"]
-        harvest_dates = []
-        for event in management_events:
-            if event["mgmt_operations_event"] == "harvest":
-                harvest_dates.append(event["date"])
+        harvest_events = self._classify_events(field_id)["harvest"]
+        harvest_dates = [event["date"] for event in harvest_events]
         return harvest_dates
 
     def get_mowing_dates(self, field_id: str) -> list:
@@ -145,14 +499,8 @@ class FOBucket:
         mowing_dates : list
             Mowing dates for the field
         """
-        events = self.get_events(field_id)
-        if events is None:
-            return []
-        management_events = events["management"]["events"]
-        mowing_dates = []
-        for event in management_events:
-            if event["mgmt_operations_event"] == "mowing":
-                mowing_dates.append(event["date"])
+        mowing_events = self._classify_events(field_id)["mowing"]
+        mowing_dates = [event["date"] for event in mowing_events]
         return mowing_dates
 
     def get_species_events(self, field_id: str) -> list:
@@ -170,21 +518,14 @@ class FOBucket:
             Species events for the field
 
         """
-        events = self.get_events(field_id)
-        if events is None:
-            return []
-        management_events = events["management"]["events"]
         species_events = []
-        for event in management_events:
+        for event in self._classify_events(field_id)["harvest_or_mowing"]:
             if event["mgmt_operations_event"] == "harvest":
                 species = event["harvest_crop"]
-            elif event["mgmt_operations_event"] == "mowing":
-                if "moved_crop" in event:
-                    species = event["moved_crop"]
-                else:
-                    species = "-99.0"
+            elif "moved_crop" in event:
+                species = event["moved_crop"]
             else:
-                continue
+                species = "-99.0"
 
             species_event = {
                 "date": event["date"],
@@ -210,25 +551,19 @@ class FOBucket:
             Harvest amounts for the field
 
         """
-        events = self.get_events(field_id)
-        if events is None:
-            return []
-        management_events = events["management"]["events"]
         harvest_amounts = []
+        for event in self._classify_events(field_id)["harvest"]:
+            if "harvest_yield_harvest_dw_total" in event:
+                amount = event["harvest_yield_harvest_dw_total"]
+            elif "harvest_yield_harvest_dw" in event:
+                amount = event["harvest_yield_harvest_dw"]
+            else:
+                continue
 
-        for event in management_events:
-            if event["mgmt_operations_event"] == "harvest":
-                if "harvest_yield_harvest_dw_total" in event:
-                    amount = event["harvest_yield_harvest_dw_total"]
-                elif "harvest_yield_harvest_dw" in event:
-                    amount = event["harvest_yield_harvest_dw"]
-                else:
-                    continue
-
-                if (amount == -99.0) or (amount == "-99.0"):
-                    amount = None
+            if (amount == -99.0) or (amount == "-99.0"):
+                amount = None
 
-                harvest_amounts.append(amount)
+            harvest_amounts.append(amount)
 
         return harvest_amounts
 
@@ -247,28 +582,23 @@ class FOBucket:
             List of harvest events for the field
 
         """
-        events = self.get_events(field_id)
-        if events is None:
-            return []
-        management_events = events["management"]["events"]
         harvest_events = []
-        for event in management_events:
+        for event in self._classify_events(field_id)["harvest"]:
             event_info = {}
-            if event["mgmt_operations_event"] == "harvest":
-                event_info["date"] = event["date"]
-                if "harvest_yield_harvest_dw_total" in event:
-                    event_info["amount"] = event["harvest_yield_harvest_dw_total"]
-                elif "harvest_yield_harvest_dw" in event:
-                    event_info["amount"] = event["harvest_yield_harvest_dw"]
-                else:
-                    event_info["amount"] = None
+            event_info["date"] = event["date"]
+            if "harvest_yield_harvest_dw_total" in event:
+                event_info["amount"] = event["harvest_yield_harvest_dw_total"]
+            elif "harvest_yield_harvest_dw" in event:
+                event_info["amount"] = event["harvest_yield_harvest_dw"]
+            else:
+                event_info["amount"] = None
 
-                if event_info["amount"] == "-99.0":
-                    event_info["amount"] = None
+            if event_info["amount"] == "-99.0":
+                event_info["amount"] = None
 
-                event_info["event_type"] = "harvest"
+            event_info["event_type"] = "harvest"
 
-                harvest_events.append(event_info)
+            harvest_events.append(event_info)
 
         return harvest_events
 
@@ -287,19 +617,10 @@ class FOBucket:
             List of mowing events for the field
 
         """
-        events = self.get_events(field_id)
-        if events is None:
-            return []
-        management_events = events["management"]["events"]
-        harvest_events = []
-        for event in management_events:
-            event_info = {}
-            if event["mgmt_operations_event"] == "mowing":
-                event_info["date"] = event["date"]
-                event_info["amount"] = None
-                event_info["event_type"] = "mowing"
-                harvest_events.append(event_info)
-
+        harvest_events = [
+            {"date": event["date"], "amount": None, "event_type": "mowing"}
+            for event in self._classify_events(field_id)["mowing"]
+        ]
         return harvest_events
 
     def get_observation_events(self, field_id: str) -> list:
@@ -316,14 +637,10 @@ class FOBucket:
         observation_events : list
             List of observation events for the field
         """
-        events = self.get_events(field_id)
-        if events is None:
-            return []
-        management_events = events["management"]["events"]
-        observation_events = []
-        for event in management_events:
-            if event["mgmt_operations_event"] == "observation":
-                observation_events.append(event)
+        # Copy the events so callers can't modify the cached events
+        observation_events = [
+            dict(event) for event in self._classify_events(field_id)["observation"]
+        ]
         return observation_events
 
     def get_AGB_observations(self, field_id: str) -> list:
@@ -340,22 +657,100 @@ class FOBucket:
         AGB_observations : list
             List of AGB observations for the field
         """
-        observation_events = self.get_observation_events(field_id)
         AGB_observations = []
-        if observation_events is not None:
-            for event in observation_events:
-                if ("observation_type" in event) and (
-                    event["observation_type"] == "observation_type_vegetation"
-                    and "tops_C" in event
-                    and event["tops_C"] != "-99.0"
-                ):
-                    biomass_observation = {
-                        "date": event["date"],
-                        "AGB (gC/m2)": event["tops_C"],
-                    }
-                    AGB_observations.append(biomass_observation)
+        for event in self._classify_events(field_id)["observation"]:
+            if ("observation_type" in event) and (
+                event["observation_type"] == "observation_type_vegetation"
+                and "tops_C" in event
+                and event["tops_C"] != "-99.0"
+            ):
+                biomass_observation = {
+                    "date": event["date"],
+                    "AGB (gC/m2)": event["tops_C"],
+                }
+                AGB_observations.append(biomass_observation)
         return AGB_observations
 
+    def get_harvest_dates_batch(
+        self, field_ids: list, max_workers: int = MAX_BATCH_WORKERS
+    ) -> dict:
+        """
+        Get harvest dates for several fields concurrently
+
+        Parameters
+        ----------
+        field_ids : list
+            Field IDs
+        max_workers : int, optional
+            Maximum number of concurrent requests
+
+        Returns
+        -------
+        harvest_dates : dict
+            Harvest dates keyed by field ID
+        """
+        return self._map_fields(self.get_harvest_dates, field_ids, max_workers)
+
+    def get_mowing_dates_batch(
+        self, field_ids: list, max_workers: int = MAX_BATCH_WORKERS
+    ) -> dict:
+        """
+        Get mowing dates for several fields concurrently
+
+        Parameters
+        ----------
+        field_ids : list
+            Field IDs
+        max_workers : int, optional
+            Maximum number of concurrent requests
+
+        Returns
+        -------
+        mowing_dates : dict
+            Mowing dates keyed by field ID
+        """
+        return self._map_fields(self.get_mowing_dates, field_ids, max_workers)
+
+    def get_harvest_info_batch(
+        self, field_ids: list, max_workers: int = MAX_BATCH_WORKERS
+    ) -> dict:
+        """
+        Get harvest events for several fields concurrently
+
+        Parameters
+        ----------
+        field_ids : list
+            Field IDs
+        max_workers : int, optional
+            Maximum number of concurrent requests
+
+        Returns
+        -------
+        harvest_events : dict
+            Lists of harvest events keyed by field ID
+        """
+        return self._map_fields(self.get_harvest_info, field_ids, max_workers)
+
+    def get_AGB_observations_batch(
+        self, field_ids: list, max_workers: int = MAX_BATCH_WORKERS
+    ) -> dict:
+        """
+        Get AGB observations for several fields concurrently
+
+        Parameters
+        ----------
+        field_ids : list
+            Field IDs
+        max_workers : int, optional
+            Maximum number of concurrent requests
+
+        Returns
+        -------
+        AGB_observations : dict
+            Lists of AGB observations keyed by field ID
+        """
+        return self._map_fields(self.get_AGB_observations, field_ids, max_workers)
+
     # Get harvest amount of specific date and field
     def get_harvest_amount(self, field_id: str, date: str) -> float:
         """
@@ -374,16 +769,16 @@ class FOBucket:
             Harvest amount for the field and date
         """
         harvest_events = self.get_harvest_info(field_id)
-        amount = None
-        for event in harvest_events:
-            if pd.to_datetime(event["date"]) == pd.to_datetime(date):
-                amount = event["amount"]
-                if amount == "-99.0":
-                    amount = None
-                else:
-                    amount = event["amount"]
-            else:
-                amount = None
+        harvest_dates = pd.to_datetime(
+            [event["date"] for event in harvest_events], format="mixed"
+        )
+        matches = (harvest_dates == pd.to_datetime(date)).nonzero()[0]
+        if len(matches) == 0:
+            return None
+        # Keep the first harvest of the date
+        amount = harvest_events[matches[0]]["amount"]
+        if amount == "-99.0":
+            amount = None
         return amount
 
     # Get event type of specific date and field
@@ -403,19 +798,15 @@ class FOBucket:
         event_type : str
             Event type for the field and date
         """
-        events = self.get_events(field_id)
-        if events is None:
+        event_dates = self._get_event_dates(field_id)
+        if event_dates is None:
             return []
-        management_events = events["management"]["events"]
-        event_type = None
-        for event in management_events:
-            # If no date, skip
-            if "date" not in event:
-                continue
-            if pd.to_datetime(event["date"]) == pd.to_datetime(date):
-                event_type = event["mgmt_operations_event"]
-            else:
-                continue
+        event_types, dates = event_dates
+        matches = (dates == pd.to_datetime(date)).nonzero()[0]
+        if len(matches) == 0:
+            return None
+        # Keep the last event of the date
+        event_type = event_types[matches[-1]]
         return event_type
 
     # CSV Data handling
@@ -473,10 +864,35 @@ class FOBucket:
         df : pd.DataFrame
             Dataframe of the timeseries data
         """
-        files = csv_files(self.list_files(prefix))
-        df = read_files_to_dataframe(files)
+        keys = csv_files(self.iter_files(prefix, return_key=True))
+        df = read_files_to_dataframe(keys, read_file=self.read_csv_object)
         return df
 
+    def get_timeseries_data_arrow(self, prefix: str) -> "pyarrow.Table":
+        """
+        Get timeseries data for a given prefix as a PyArrow table
+
+        Requires the optional pyarrow dependency. The CSV files are parsed
+        with the multithreaded Arrow reader into columnar buffers, use
+        `table.to_pandas(self_destruct=True)` if a dataframe is needed.
+
+        Parameters
+        ----------
+        prefix : str
+            Prefix
+
+        Returns
+        -------
+        table : pyarrow.Table
+            Table of the timeseries data
+        """
+        pa = _import_pyarrow()
+        keys = csv_files(self.iter_files(prefix, return_key=True))
+        with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+            tables = list(executor.map(self.read_csv_object_arrow, keys))
+        table = pa.concat_tables(tables, promote_options="permissive")
+        return table
+
     def get_field_satellite_timeseries_data(
         self, field_id: str, variable: str
     ) -> pd.DataFrame:
@@ -497,41 +913,149 @@ class FOBucket:
         """
         variable = variable.lower()
         data_prefix = field_id.replace("_", "/") + "/sentinel"
-        files = csv_files(self.list_files(data_prefix))
-        variable_files = [f for f in files if f"{variable}.csv" in f]
-        df = read_files_to_dataframe(variable_files)
+        keys = csv_files(self.iter_files(data_prefix, return_key=True))
+        variable_keys = [k for k in keys if f"{variable}.csv" in k]
+        df = read_files_to_dataframe(variable_keys, read_file=self.read_csv_object)
         return df
 
+    def read_csv_object(self, key: str) -> pd.DataFrame:
+        """
+        Read a timeseries CSV file from S3 bucket
+
+        The file is read through the S3 client, so concurrent reads share
+        its connection pool instead of opening a new connection per file.
+
+        Parameters
+        ----------
+        key : str
+            Key of the CSV file
+
+        Returns
+        -------
+        df : pd.DataFrame
+            Dataframe of the file
+        """
+        response = self.client.get_object(Bucket=FOBucket.FO_BUCKET_NAME, Key=key)
+        df = read_csv_file(response["Body"])
+        return df
+
+    def read_csv_object_arrow(self, key: str) -> "pyarrow.Table":
+        """
+        Read a timeseries CSV file from S3 bucket as a PyArrow table
+
+        Requires the optional pyarrow dependency.
+
+        Parameters
+        ----------
+        key : str
+            Key of the CSV file
+
+        Returns
+        -------
+        table : pyarrow.Table
+            Table of the file
+        """
+        pa = _import_pyarrow()
+        response = self.client.get_object(Bucket=FOBucket.FO_BUCKET_NAME, Key=key)
+        table = pa.csv.read_csv(pa.py_buffer(response["Body"].read()))
+        return table
+
     def read_block_geojson(self) -> dict:
         """
         Read block geojson file from S3 bucket
 
+        Returns
+        -------
+        block_json : dict
+            Block geojson as dict
+
+        Notes
+        -----
+        The geojson is cached after the first read, see `invalidate_cache`.
+        Each call returns a new copy, so modifying it does not change the
+        cache.
+        """
+        block_json = self._read_cached_block_geojson()
+        return copy.deepcopy(block_json)
+
+    def _read_cached_block_geojson(self) -> dict:
+        """
+        Read the cached block geojson, reading it on first use
+
+        The returned dict is shared with the cache and must not be modified.
+
         Returns
         -------
         block_json : dict
             Block geojson as dict
         """
+        if self._block_json is not None:
+            return self._block_json
+
         block_geojson = FO_BLOCK_GEOJSON
-        object = self.s3.Object(FOBucket.FO_BUCKET_NAME, block_geojson)
-        file_content = object.get()["Body"].read().decode("utf-8")
-        block_json = json.loads(file_content)
+        file_content = self._read_object(block_geojson)
+        block_json = orjson.loads(file_content)
+        self._block_json = block_json
         return block_json
 
     def read_site_geojson(self) -> dict:
         """
         Read site geojson file from S3 bucket
 
+        Returns
+        -------
+        site_json : dict
+            Site geojson as dict
+
+        Notes
+        -----
+        The geojson is cached after the first read, see `invalidate_cache`.
+        Each call returns a new copy, so modifying it does not change the
+        cache.
+        """
+        site_json = self._read_cached_site_geojson()
+        return copy.deepcopy(site_json)
+
+    def _read_cached_site_geojson(self) -> dict:
+        """
+        Read the cached site geojson, reading it on first use
+
+        The returned dict is shared with the cache and must not be modified.
+
         Returns
         -------
         site_json : dict
             Site geojson as dict
         """
+        if self._site_json is not None:
+            return self._site_json
+
         site_geojson = FO_SITE_GEOJSON
-        object = self.s3.Object(FOBucket.FO_BUCKET_NAME, site_geojson)
-        file_content = object.get()["Body"].read().decode("utf-8")
-        site_json = json.loads(file_content)
+        file_content = self._read_object(site_geojson)
+        site_json = orjson.loads(file_content)
+        self._site_json = site_json
         return site_json
 
+    def _get_site_index(self) -> dict:
+        """
+        Get site geojson features indexed by site ID
+
+        Returns
+        -------
+        site_index : dict
+            Site geojson features keyed by site ID
+
+        Notes
+        -----
+        The index is cached after it is first built, see `invalidate_cache`.
+        """
+        if self._site_index is not None:
+            return self._site_index
+
+        site_index = _index_features(self._read_cached_site_geojson())
+        self._site_index = site_index
+        return site_index
+
     def get_sites(self, site_type_filter: Optional[Union[list, str]] = None) -> list:
         """
         Get sites from the site geojson
@@ -554,7 +1078,7 @@ class FOBucket:
             else:
                 raise ValueError("site_type_filter must be a string or a list")
 
-        site_json = self.read_site_geojson()
+        site_json = self._read_cached_site_geojson()
         sites = []
         for feature in site_json["features"]:
             site = feature["properties"]["id"]
@@ -601,7 +1125,7 @@ class FOBucket:
             else:
                 raise ValueError("site_type_filter must be a string or a list")
 
-        block_json = self.read_block_geojson()
+        block_json = self._read_cached_block_geojson()
         fields = []
         for feature in block_json["features"]:
             field_within_filters = False
@@ -630,13 +1154,33 @@ class FOBucket:
         site_types : list
             List of site types
         """
-        site_json = self.read_site_geojson()
+        site_json = self._read_cached_site_geojson()
         site_types = []
         for feature in site_json["features"]:
             site_type = feature["properties"]["site_type"]
             site_types.append(site_type)
         return site_types
 
+    def _get_field_index(self) -> dict:
+        """
+        Get block geojson features indexed by field ID
+
+        Returns
+        -------
+        field_index : dict
+            Block geojson features keyed by field ID
+
+        Notes
+        -----
+        The index is cached after it is first built, see `invalidate_cache`.
+        """
+        if self._field_index is not None:
+            return self._field_index
+
+        field_index = _index_features(self._read_cached_block_geojson())
+        self._field_index = field_index
+        return field_index
+
     def get_field_information(self, field_id: str) -> dict:
         """
         Get field information for a given field
@@ -656,19 +1200,17 @@ class FOBucket:
         ValueError
             If the field is not found
 
+        Notes
+        -----
+        Each call returns a new copy of the cached feature, so modifying it
+        does not change the cache.
+
         """
-        block_json = self.read_block_geojson()
-        field_information = None
-        for feature in block_json["features"]:
-            if feature["properties"]["id"] == field_id:
-                field_information = feature
-                break
-            else:
-                continue
+        field_information = self._get_field_index().get(field_id)
         if field_information is None:
             raise ValueError(f"Field {field_id} not found.")
         else:
-            return field_information
+            return copy.deepcopy(field_information)
 
     def get_field_geometry(self, field_id: str) -> dict:
         """
@@ -692,7 +1234,7 @@ class FOBucket:
         self, site: str, field: str, device_type: str
     ) -> list:
         prefix = f"{site}/{field}/datasense/{device_type}"
-        files = self.list_files(prefix, return_key=True)
+        files = self.iter_files(prefix, return_key=True)
         dirs = [s.split("/")[-2] for s in files]
         # get unique dir names
         dirs = list(set(dirs))
@@ -700,45 +1242,103 @@ class FOBucket:
 
     def get_site_datasense_devices(self, site: str, device_type: str) -> list:
         prefix = f"{site}/datasense/{device_type}"
-        files = self.list_files(prefix, return_key=True)
+        files = self.iter_files(prefix, return_key=True)
         dirs = [s.split("/")[-2] for s in files]
         # get unique dir names
         dirs = list(set(dirs))
         return dirs
 
     def get_site_fmi_weather_station_id(self, site: str) -> int:
-        site_json = self.read_site_geojson()
-        for feature in site_json["features"]:
-            if feature["properties"]["id"] == site:
-                fmi_station = feature["properties"]["fmisid"]
-                return fmi_station
+        feature = self._get_site_index().get(site)
+        if feature is not None:
+            fmi_station = feature["properties"]["fmisid"]
+            return fmi_station
+
+
+def _cache_file_name(etag: str) -> Optional[str]:
+    etag = etag.strip('"')
+    # The ETag comes from the server, only use it as a file name if it is safe
+    if re.fullmatch(r"[0-9A-Za-z-]+", etag) is None:
+        return None
+    return etag + FO_CACHE_SUFFIX
+
+
+def _index_features(geojson: dict) -> dict:
+    features = {}
+    for feature in geojson["features"]:
+        # Keep the first feature if an ID is repeated
+        features.setdefault(feature["properties"]["id"], feature)
+    return features
 
 
-def csv_files(files):
-    return [f for f in files if f.endswith(".csv")]
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required for Arrow output, install it with "
+            "'pip install \"field_observatory_s3[arrow] @ "
+            "git+https://github.com/ollinevalainen/field_observatory_s3.git\"'"
+        ) from e
+    return pyarrow
 
 
-def read_files_to_dataframe(files) -> pd.DataFrame:
+def csv_files(files: Iterable[str]) -> Iterator[str]:
+    return (f for f in files if f.endswith(".csv"))
+
+
+def read_csv_file(f) -> pd.DataFrame:
+    """
+    Read a timeseries CSV file, using the first column as the time index
+
+    Parameters
+    ----------
+    f : str
+        File URL or path
+
+    Returns
+    -------
+    df : pd.DataFrame
+        Dataframe of the file
+
+    Raises
+    ------
+    ValueError
+        If the time column can't be parsed as dates
+    """
+    df = pd.read_csv(f, index_col=0)
+    # Unlike parse_dates, pd.to_datetime raises if the column can't be parsed
+    df.index = pd.to_datetime(df.index)
+    return df
+
+
+def read_files_to_dataframe(
+    files,
+    max_workers: int = MAX_DOWNLOAD_WORKERS,
+    read_file: Callable[[str], pd.DataFrame] = read_csv_file,
+) -> pd.DataFrame:
     """
     Read files to dataframe
 
+    Files are downloaded and parsed concurrently in a thread pool.
+
     Parameters
     ----------
     files : list
         List of files
+    max_workers : int, optional
+        Maximum number of concurrent downloads
+    read_file : callable, optional
+        Function reading a single file to dataframe, e.g.
+        `FOBucket.read_csv_object` to read keys through the S3 client
 
     Returns
     -------
     df : pd.DataFrame
         Dataframe of the files
     """
-    dfs = []
-    for f in files:
-        tmp_df = pd.read_csv(f)
-        dfs.append(tmp_df)
-
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        dfs = list(executor.map(read_file, files))
     df = pd.concat(dfs)
-    time_col = df.columns[0]
-    df[time_col] = pd.to_datetime(df[time_col])
-    df.set_index(time_col, drop=True, inplace=True)
     return df
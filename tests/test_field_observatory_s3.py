@@ -1,48 +1,66 @@
-from field_observatory_s3.field_observatory_s3 import FOBucket
+import io
+import os
+
+import orjson
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+from field_observatory_s3.field_observatory_s3 import (
+    FO_BLOCK_GEOJSON,
+    FO_SITE_GEOJSON,
+    FOBucket,
+    read_csv_file,
+)
 
 
 class TestFOBucket:
+    def test_default(self):
+        assert FOBucket.default() is FOBucket.default()
+
     def test_get_sites(self):
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         sites = fo_bucket.get_sites()
         assert isinstance(sites, list) == True
         assert len(sites) > 0
 
     def test_get_sites_with_site_type_filter(self):
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         sites = fo_bucket.get_sites(site_type_filter="Intensive Site")
         assert isinstance(sites, list) == True
         assert len(sites) > 0
         assert "qvidja" in sites
 
     def test_get_fields(self):
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         fields = fo_bucket.get_fields()
         assert isinstance(fields, list) == True
         assert len(fields) > 0
 
     def test_get_fields_with_site_filter(self):
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         fields = fo_bucket.get_fields(site_filter="qvidja")
         assert isinstance(fields, list) == True
         assert len(fields) > 0
         assert "qvidja_ec" in fields
 
     def test_get_fields_with_site_type_filter(self):
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         fields = fo_bucket.get_fields(site_type_filter="Intensive Site")
         assert isinstance(fields, list) == True
         assert len(fields) > 0
         assert "qvidja_ec" in fields
 
     def test_get_site_types(self):
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         site_types = fo_bucket.get_site_types()
         assert isinstance(site_types, list) == True
         assert len(site_types) > 0
 
     def test_get_field_datasense_devices(self):
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         field_datasense_devices = fo_bucket.get_field_datasense_devices(
             "ki", "0", "soil_sensors"
         )
@@ -51,7 +69,7 @@ class TestFOBucket:
         assert set(field_datasense_devices) == set(expected_devices)
 
     def test_get_site_datasense_devices(self):
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         site_datasense_devices = fo_bucket.get_site_datasense_devices(
             "ki", "precipitation_sensors"
         )
@@ -62,21 +80,400 @@ class TestFOBucket:
     def test_get_site_timeseries_data(self):
         import pandas as pd
 
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         df = fo_bucket.get_site_timeseries_data("ki", "fmimeteo")
         assert isinstance(df, pd.DataFrame) == True
         assert df.empty == False
 
     def test_get_site_fmi_weather_station_id(self):
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         station_id = fo_bucket.get_site_fmi_weather_station_id("ki")
         assert station_id == 100967
 
     def test_get_field_satellite_timeseries_data(self):
         import pandas as pd
 
-        fo_bucket = FOBucket()
+        fo_bucket = FOBucket.default()
         df = fo_bucket.get_field_satellite_timeseries_data("ki_0", "ndvi")
         assert isinstance(df, pd.DataFrame) == True
         assert df.empty == False
         assert "ndvi" in df.columns
+
+    def test_get_events_is_cached(self):
+        fo_bucket = FOBucket()
+        events = fo_bucket.get_events("qvidja_ec")
+        assert fo_bucket.get_events("qvidja_ec") == events
+        assert fo_bucket.get_events("qvidja_ec") is not events
+        fo_bucket.invalidate_cache()
+        assert fo_bucket.get_events("qvidja_ec") == events
+
+    def test_get_harvest_amount(self):
+        fo_bucket = FOBucket.default()
+        harvest_info = fo_bucket.get_harvest_info("qvidja_ec")
+        assert len(harvest_info) > 0
+        first_harvest = harvest_info[0]
+        amount = fo_bucket.get_harvest_amount("qvidja_ec", first_harvest["date"])
+        assert amount == first_harvest["amount"]
+        assert fo_bucket.get_harvest_amount("qvidja_ec", "1900-01-01") is None
+
+    def test_get_events_batch(self):
+        fo_bucket = FOBucket.default()
+        events = fo_bucket.get_events_batch(["qvidja_ec", "ki_0"])
+        assert set(events.keys()) == {"qvidja_ec", "ki_0"}
+        assert events["qvidja_ec"] == fo_bucket.get_events("qvidja_ec")
+
+    def test_get_harvest_dates_batch(self):
+        fo_bucket = FOBucket.default()
+        harvest_dates = fo_bucket.get_harvest_dates_batch(["qvidja_ec", "ki_0"])
+        assert harvest_dates["qvidja_ec"] == fo_bucket.get_harvest_dates("qvidja_ec")
+        assert harvest_dates["ki_0"] == fo_bucket.get_harvest_dates("ki_0")
+
+
+def stub_get_object(stubber, key, content):
+    stubber.add_response(
+        "get_object",
+        {"Body": StreamingBody(io.BytesIO(content), len(content))},
+        {"Bucket": FOBucket.FO_BUCKET_NAME, "Key": key},
+    )
+
+
+class TestFOBucketStubbed:
+    EVENTS = {
+        "management": {
+            "events": [
+                {
+                    "mgmt_operations_event": "harvest",
+                    "date": "2020-07-01",
+                    "harvest_yield_harvest_dw": 3.0,
+                },
+                {"mgmt_operations_event": "mowing", "date": "2020-08-01"},
+                {
+                    "mgmt_operations_event": "observation",
+                    "date": "2020-06-01",
+                    "observation_type": "observation_type_vegetation",
+                    "tops_C": "50.0",
+                },
+            ]
+        }
+    }
+
+    def stubbed_events_bucket(self):
+        fo_bucket = FOBucket(cache_dir=None)
+        stubber = Stubber(fo_bucket.client)
+        stub_get_object(stubber, "ki/0/events.json", orjson.dumps(self.EVENTS))
+        stubber.activate()
+        return fo_bucket
+
+    def test_event_getters_are_independent(self):
+        # The harvest event has no harvest_crop, only get_species_events fails
+        fo_bucket = self.stubbed_events_bucket()
+        assert fo_bucket.get_harvest_dates("ki_0") == ["2020-07-01"]
+        assert fo_bucket.get_mowing_dates("ki_0") == ["2020-08-01"]
+        assert fo_bucket.get_harvest_amounts("ki_0") == [3.0]
+        with pytest.raises(KeyError):
+            fo_bucket.get_species_events("ki_0")
+        assert fo_bucket.get_harvest_amount("ki_0", "2020-07-01") == 3.0
+
+    def test_event_getters_return_new_objects(self):
+        fo_bucket = self.stubbed_events_bucket()
+        harvest_info = fo_bucket.get_harvest_info("ki_0")
+        harvest_info[0]["amount"] = 999
+        assert fo_bucket.get_harvest_info("ki_0")[0]["amount"] == 3.0
+        assert fo_bucket.get_harvest_amount("ki_0", "2020-07-01") == 3.0
+        observation_events = fo_bucket.get_observation_events("ki_0")
+        observation_events[0]["tops_C"] = "-99.0"
+        assert fo_bucket.get_observation_events("ki_0")[0]["tops_C"] == "50.0"
+        assert fo_bucket.get_AGB_observations("ki_0") == [
+            {"date": "2020-06-01", "AGB (gC/m2)": "50.0"}
+        ]
+
+    def test_get_events_returns_new_objects(self):
+        fo_bucket = self.stubbed_events_bucket()
+        events = fo_bucket.get_events("ki_0")
+        events["management"]["events"][0]["date"] = "1900-01-01"
+        assert fo_bucket.get_events("ki_0") == self.EVENTS
+        assert fo_bucket.get_harvest_dates("ki_0") == ["2020-07-01"]
+
+    def test_batch_getters_accept_generators(self):
+        fo_bucket = FOBucket(cache_dir=None)
+        stubber = Stubber(fo_bucket.client)
+        # The fields are read concurrently, so do not expect a request order
+        for _ in range(2):
+            content = orjson.dumps(self.EVENTS)
+            stubber.add_response(
+                "get_object", {"Body": StreamingBody(io.BytesIO(content), len(content))}
+            )
+        with stubber:
+            harvest_dates = fo_bucket.get_harvest_dates_batch(
+                field_id for field_id in ["ki_0", "ki_1"]
+            )
+            events = fo_bucket.get_events_batch(iter(["ki_0", "ki_1"]))
+        assert harvest_dates == {"ki_0": ["2020-07-01"], "ki_1": ["2020-07-01"]}
+        assert events == {"ki_0": self.EVENTS, "ki_1": self.EVENTS}
+
+    def test_missing_events_file(self):
+        fo_bucket = FOBucket(cache_dir=None)
+        stubber = Stubber(fo_bucket.client)
+        stubber.add_client_error(
+            "get_object",
+            service_error_code="NoSuchKey",
+            http_status_code=404,
+            expected_params={
+                "Bucket": FOBucket.FO_BUCKET_NAME,
+                "Key": "ki/0/events.json",
+            },
+        )
+        with stubber:
+            assert fo_bucket.get_events("ki_0") is None
+            # The missing file is cached and not requested again
+            assert fo_bucket.get_events("ki_0") is None
+            assert fo_bucket.get_harvest_dates("ki_0") == []
+
+    def test_missing_events_file_with_disk_cache(self, tmp_path):
+        fo_bucket = FOBucket(cache_dir=str(tmp_path))
+        stubber = Stubber(fo_bucket.client)
+        # HEAD responses have no body, so a missing object has code "404"
+        stubber.add_client_error(
+            "head_object",
+            service_error_code="404",
+            http_status_code=404,
+            expected_params={
+                "Bucket": FOBucket.FO_BUCKET_NAME,
+                "Key": "ki/0/events.json",
+            },
+        )
+        with stubber:
+            assert fo_bucket.get_events("ki_0") is None
+            assert fo_bucket.get_events("ki_0") is None
+        assert os.listdir(tmp_path) == []
+
+    def test_events_file_access_error_raises(self):
+        fo_bucket = FOBucket(cache_dir=None)
+        stubber = Stubber(fo_bucket.client)
+        stubber.add_client_error(
+            "get_object", service_error_code="AccessDenied", http_status_code=403
+        )
+        stubber.add_client_error(
+            "get_object", service_error_code="AccessDenied", http_status_code=403
+        )
+        with stubber:
+            with pytest.raises(ClientError):
+                fo_bucket.get_events("ki_0")
+            # The error is not cached
+            with pytest.raises(ClientError):
+                fo_bucket.get_events("ki_0")
+
+    def test_event_dates_in_mixed_formats(self):
+        events = {
+            "management": {
+                "events": [
+                    {"mgmt_operations_event": "sowing", "date": "01.07.2020"},
+                    {
+                        "mgmt_operations_event": "harvest",
+                        "date": "2020-08-01",
+                        "harvest_yield_harvest_dw": 3.0,
+                    },
+                ]
+            }
+        }
+        fo_bucket = FOBucket(cache_dir=None)
+        stubber = Stubber(fo_bucket.client)
+        stub_get_object(stubber, "ki/0/events.json", orjson.dumps(events))
+        with stubber:
+            assert fo_bucket.get_event_type("ki_0", "2020-08-01") == "harvest"
+            assert fo_bucket.get_event_type("ki_0", "01.07.2020") == "sowing"
+            assert fo_bucket.get_harvest_amount("ki_0", "2020-08-01") == 3.0
+
+    def test_get_timeseries_data_arrow(self):
+        pa = pytest.importorskip("pyarrow")
+        fo_bucket = FOBucket(cache_dir=None)
+        stubber = Stubber(fo_bucket.client)
+        stubber.add_response(
+            "list_objects_v2",
+            {
+                "Contents": [
+                    {"Key": "ki/0/sentinel/2020_ndvi.csv"},
+                    {"Key": "ki/0/sentinel/2021_ndvi.csv"},
+                    {"Key": "ki/0/sentinel/readme.txt"},
+                ],
+                "IsTruncated": False,
+            },
+            {"Bucket": FOBucket.FO_BUCKET_NAME, "Prefix": "ki/0/sentinel"},
+        )
+        # The files are read concurrently, so do not expect a request order
+        for content in [
+            b"time,ndvi\n2020-06-01T00:00:00Z,0.5\n",
+            b"time,ndvi\n2021-06-01T00:00:00Z,1\n2021-07-01T00:00:00Z,\n",
+        ]:
+            stubber.add_response(
+                "get_object", {"Body": StreamingBody(io.BytesIO(content), len(content))}
+            )
+        with stubber:
+            table = fo_bucket.get_timeseries_data_arrow("ki/0/sentinel")
+        assert isinstance(table, pa.Table)
+        assert table.num_rows == 3
+        assert table.column_names == ["time", "ndvi"]
+        assert pa.types.is_floating(table.schema.field("ndvi").type)
+
+    BLOCKS = {
+        "features": [
+            {
+                "properties": {"id": "ki_0", "site": "ki"},
+                "geometry": {"type": "Point", "coordinates": [20.8, 69.0]},
+            },
+            {
+                "properties": {"id": "ki_1", "site": "ki"},
+                "geometry": {"type": "Point", "coordinates": [20.9, 69.1]},
+            },
+        ]
+    }
+
+    def test_get_field_information(self):
+        fo_bucket = FOBucket(cache_dir=None)
+        stubber = Stubber(fo_bucket.client)
+        stub_get_object(stubber, FO_BLOCK_GEOJSON, orjson.dumps(self.BLOCKS))
+        with stubber:
+            field_information = fo_bucket.get_field_information("ki_1")
+            field_geometry = fo_bucket.get_field_geometry("ki_0")
+            with pytest.raises(ValueError):
+                fo_bucket.get_field_information("ki_2")
+        assert field_information == self.BLOCKS["features"][1]
+        assert field_geometry == self.BLOCKS["features"][0]["geometry"]
+
+    def test_field_getters_return_new_objects(self):
+        fo_bucket = FOBucket(cache_dir=None)
+        stubber = Stubber(fo_bucket.client)
+        stub_get_object(stubber, FO_BLOCK_GEOJSON, orjson.dumps(self.BLOCKS))
+        with stubber:
+            fo_bucket.get_field_geometry("ki_0")["coordinates"][0] = 0.0
+            fo_bucket.read_block_geojson()["features"].pop()
+            assert fo_bucket.get_field_information("ki_0") == self.BLOCKS["features"][0]
+            assert fo_bucket.read_block_geojson() == self.BLOCKS
+            assert fo_bucket.get_fields() == ["ki_0", "ki_1"]
+
+    def test_get_site_fmi_weather_station_id_from_index(self):
+        sites = {
+            "features": [
+                {"properties": {"id": "ki", "site_type": "a", "fmisid": 100967}},
+                {"properties": {"id": "qvidja", "site_type": "b", "fmisid": 100949}},
+            ]
+        }
+        fo_bucket = FOBucket(cache_dir=None)
+        stubber = Stubber(fo_bucket.client)
+        # The site geojson is read only once for all lookups
+        stub_get_object(stubber, FO_SITE_GEOJSON, orjson.dumps(sites))
+        with stubber:
+            assert fo_bucket.get_site_fmi_weather_station_id("qvidja") == 100949
+            assert fo_bucket.get_site_fmi_weather_station_id("ki") == 100967
+            assert fo_bucket.get_site_fmi_weather_station_id("unknown") is None
+            assert fo_bucket.get_sites() == ["ki", "qvidja"]
+            fo_bucket.read_site_geojson()["features"].pop()
+            assert fo_bucket.read_site_geojson() == sites
+
+
+class TestReadCsvFile:
+    def test_read_csv_file(self):
+        df = read_csv_file(io.StringIO("time,ndvi\n2020-06-01T00:00:00Z,0.5\n"))
+        assert isinstance(df.index, pd.DatetimeIndex)
+        assert df["ndvi"].tolist() == [0.5]
+
+    def test_unparsable_time_column_raises(self):
+        content = (
+            "time,ndvi\n2020-01-01T00:00:00+02:00,0.5\n2020-06-01T00:00:00+03:00,1\n"
+        )
+        with pytest.raises(ValueError):
+            read_csv_file(io.StringIO(content))
+
+
+def stub_cached_get_object(stubber, key, content, etag):
+    params = {"Bucket": FOBucket.FO_BUCKET_NAME, "Key": key}
+    stubber.add_response("head_object", {"ETag": f'"{etag}"'}, params)
+    stubber.add_response(
+        "get_object",
+        {"Body": StreamingBody(io.BytesIO(content), len(content)), "ETag": f'"{etag}"'},
+        params,
+    )
+
+
+class TestFOBucketDiskCache:
+    EVENTS = {"management": {"events": []}}
+
+    def test_disk_cache_is_reused(self, tmp_path):
+        content = orjson.dumps(self.EVENTS)
+        fo_bucket = FOBucket(cache_dir=str(tmp_path))
+        stubber = Stubber(fo_bucket.client)
+        stub_cached_get_object(stubber, "ki/0/events.json", content, "etag0")
+        with stubber:
+            assert fo_bucket.get_events("ki_0") == self.EVENTS
+        assert os.listdir(tmp_path) == ["etag0.fo-cache"]
+
+        # A new instance only checks the ETag and reads the file from disk
+        fo_bucket = FOBucket(cache_dir=str(tmp_path))
+        stubber = Stubber(fo_bucket.client)
+        stubber.add_response(
+            "head_object",
+            {"ETag": '"etag0"'},
+            {"Bucket": FOBucket.FO_BUCKET_NAME, "Key": "ki/0/events.json"},
+        )
+        with stubber:
+            assert fo_bucket.get_events("ki_0") == self.EVENTS
+            stubber.assert_no_pending_responses()
+
+    def test_unusable_disk_cache_falls_back_to_bucket(self, tmp_path):
+        not_a_directory = tmp_path / "file"
+        not_a_directory.write_text("")
+        fo_bucket = FOBucket(cache_dir=str(not_a_directory / "cache"))
+        stubber = Stubber(fo_bucket.client)
+        stub_cached_get_object(
+            stubber, "ki/0/events.json", orjson.dumps(self.EVENTS), "etag0"
+        )
+        with stubber:
+            assert fo_bucket.get_events("ki_0") == self.EVENTS
+
+    def test_failed_disk_cache_write_removes_temporary_file(self, tmp_path):
+        # A directory in place of the cache file makes the final rename fail
+        (tmp_path / "etag0.fo-cache").mkdir()
+        fo_bucket = FOBucket(cache_dir=str(tmp_path))
+        stubber = Stubber(fo_bucket.client)
+        stub_cached_get_object(
+            stubber, "ki/0/events.json", orjson.dumps(self.EVENTS), "etag0"
+        )
+        with stubber:
+            assert fo_bucket.get_events("ki_0") == self.EVENTS
+        assert os.listdir(tmp_path) == ["etag0.fo-cache"]
+
+    def test_disk_cache_evicts_least_recently_used(self, tmp_path):
+        content = orjson.dumps(self.EVENTS)
+        fo_bucket = FOBucket(cache_dir=str(tmp_path), cache_max_size=len(content))
+        stubber = Stubber(fo_bucket.client)
+        stub_cached_get_object(stubber, "ki/0/events.json", content, "etag0")
+        stub_cached_get_object(stubber, "ki/1/events.json", content, "etag1")
+        with stubber:
+            fo_bucket.get_events("ki_0")
+            os.utime(tmp_path / "etag0.fo-cache", (0, 0))
+            fo_bucket.get_events("ki_1")
+        assert os.listdir(tmp_path) == ["etag1.fo-cache"]
+
+    def test_unsafe_etag_is_not_cached(self, tmp_path):
+        content = orjson.dumps(self.EVENTS)
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        fo_bucket = FOBucket(cache_dir=str(cache_dir))
+        stubber = Stubber(fo_bucket.client)
+        stub_cached_get_object(stubber, "ki/0/events.json", content, "../etag0")
+        with stubber:
+            assert fo_bucket.get_events("ki_0") == self.EVENTS
+        assert os.listdir(tmp_path) == ["cache"]
+        assert os.listdir(cache_dir) == []
+
+    def test_disk_cache_eviction_keeps_other_files(self, tmp_path):
+        content = orjson.dumps(self.EVENTS)
+        other_file = tmp_path / "notes.txt"
+        other_file.write_bytes(b"x" * 1000)
+        os.utime(other_file, (0, 0))
+        fo_bucket = FOBucket(cache_dir=str(tmp_path), cache_max_size=len(content))
+        stubber = Stubber(fo_bucket.client)
+        stub_cached_get_object(stubber, "ki/0/events.json", content, "etag0")
+        with stubber:
+            fo_bucket.get_events("ki_0")
+        assert sorted(os.listdir(tmp_path)) == ["etag0.fo-cache", "notes.txt"]